@@ -2,14 +2,23 @@ from flask import Flask, render_template, request, jsonify
 import os
 import json # Added for profile persistence
 from werkzeug.utils import secure_filename
-from voice_processing import recognize_speech_from_file, extract_features
+from voice_processing import recognize_speech_from_file, extract_features, decode_audio_to_wav
+from embeddings import (DEFAULT_DTYPE, SUPPORTED_DTYPES, quantize_embeddings, embedding_distances,
+                        embedding_nbytes, embedding_to_json, embedding_from_json, footprint_report)
 import numpy as np
 
 app = Flask(__name__)
 
-UPLOAD_FOLDER = os.path.join(app.root_path, 'recordings')
+UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER', os.path.join(app.root_path, 'recordings'))
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
+# Sample rate of WAV files decoded from compressed uploads (16 kHz mono is enough for speech and MFCCs)
+app.config['DECODE_SAMPLE_RATE'] = int(os.environ.get('DECODE_SAMPLE_RATE', 16000))
+# Storage dtype for trained profiles: float64, float32 (default), float16 or int8 (scalar-quantized)
+app.config['EMBEDDING_DTYPE'] = os.environ.get('EMBEDDING_DTYPE', DEFAULT_DTYPE)
+if app.config['EMBEDDING_DTYPE'] not in SUPPORTED_DTYPES:
+    app.logger.warning(f"Unsupported EMBEDDING_DTYPE '{app.config['EMBEDDING_DTYPE']}', falling back to {DEFAULT_DTYPE}.")
+    app.config['EMBEDDING_DTYPE'] = DEFAULT_DTYPE
 
 # Define path for the persisted voice profile
 PROFILE_FILE = os.path.join(app.config['UPLOAD_FOLDER'], 'target_profile.json')
@@ -21,8 +30,10 @@ if not os.path.exists(app.config['UPLOAD_FOLDER']):
         app.logger.error(f"Error creating upload folder {app.config['UPLOAD_FOLDER']}: {e}")
 
 ALLOWED_EXTENSIONS = {'wav', 'flac', 'ogg'}
+# Formats sr.AudioFile can't read; these are piped through ffmpeg and stored as WAV instead
+FFMPEG_DECODE_EXTENSIONS = {'webm', 'ogg', 'opus'}
 
-target_voice_profile = None # Global variable for trained profile (list of floats)
+target_voice_profile = None # Global variable for trained profile (compact embedding, see embeddings.py, plus its "report")
 
 def load_existing_profile():
     """Loads the target voice profile from PROFILE_FILE if it exists."""
@@ -31,12 +42,17 @@ def load_existing_profile():
         try:
             with open(PROFILE_FILE, 'r') as f:
                 loaded_profile = json.load(f)
-                # Basic validation: check if it's a list of numbers (floats/ints)
-                if isinstance(loaded_profile, list) and all(isinstance(x, (int, float)) for x in loaded_profile):
-                    target_voice_profile = loaded_profile
-                    app.logger.info(f"Target voice profile loaded from {PROFILE_FILE} with {len(target_voice_profile)} features.")
+                # Basic validation: either a compact embedding document or a legacy list of numbers (floats/ints)
+                if isinstance(loaded_profile, dict):
+                    target_voice_profile = dict(embedding_from_json(loaded_profile), report=loaded_profile.get("report"))
+                    app.logger.info(f"Target voice profile loaded from {PROFILE_FILE} with {target_voice_profile['matrix'].shape[1]} {target_voice_profile['dtype']} features.")
+                elif isinstance(loaded_profile, list) and all(isinstance(x, (int, float)) for x in loaded_profile):
+                    # A legacy list is the exact float64 profile, so it can still serve as the report's baseline
+                    target_voice_profile = dict(quantize_embeddings(loaded_profile, app.config['EMBEDDING_DTYPE']),
+                                                report=footprint_report(loaded_profile))
+                    app.logger.info(f"Legacy target voice profile loaded from {PROFILE_FILE} with {len(loaded_profile)} features.")
                 else:
-                    app.logger.warning(f"Profile file {PROFILE_FILE} content is not a valid list of numbers. Starting without a loaded profile.")
+                    app.logger.warning(f"Profile file {PROFILE_FILE} content is not a valid profile. Starting without a loaded profile.")
                     # Optionally, remove invalid file to prevent repeated load errors
                     # os.remove(PROFILE_FILE)
         except Exception as e:
@@ -54,7 +70,7 @@ load_existing_profile()
 
 def allowed_file(filename):
     return '.' in filename and \
-           filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+           filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS | FFMPEG_DECODE_EXTENSIONS
 
 @app.route('/')
 def index():
@@ -73,17 +89,34 @@ def recognize_audio_route():
 
     if file and allowed_file(file.filename):
         filename_to_save = secure_filename(file.filename)
+        needs_decoding = filename_to_save.rsplit('.', 1)[-1].lower() in FFMPEG_DECODE_EXTENSIONS
+        if needs_decoding:
+            filename_to_save = os.path.splitext(filename_to_save)[0] + '.wav'
         temp_audio_path = os.path.join(app.config['UPLOAD_FOLDER'], filename_to_save)
 
         try:
-            file.save(temp_audio_path)
-            app.logger.info(f"Uploaded file saved to {temp_audio_path} for language {language}")
+            decode_stats = None
+            if needs_decoding:
+                decode_result = decode_audio_to_wav(file.stream, temp_audio_path, app.config['DECODE_SAMPLE_RATE'])
+                if not decode_result["success"]:
+                    app.logger.warning(f"Decoding {file.filename} failed: {decode_result['error']}")
+                    return jsonify({"success": False, "error": decode_result["error"]}), 400
+                decode_stats = {k: v for k, v in decode_result.items() if k != "success"}
+                app.logger.info(f"Decoded {file.filename} ({decode_stats['input_bytes']} bytes) to {temp_audio_path} "
+                                f"({decode_stats['output_bytes']} bytes) in {decode_stats['decode_ms']:.1f} ms for language {language}")
+            else:
+                file.save(temp_audio_path)
+                app.logger.info(f"Uploaded file saved to {temp_audio_path} for language {language}")
             recognition_result = recognize_speech_from_file(temp_audio_path, language)
 
+            response = {"success": recognition_result["success"], "filename": filename_to_save}
             if recognition_result["success"]:
-                return jsonify({"success": True, "text": recognition_result["text"], "filename": filename_to_save})
+                response["text"] = recognition_result["text"]
             else:
-                return jsonify({"success": False, "error": recognition_result["error"], "filename": filename_to_save})
+                response["error"] = recognition_result["error"]
+            if decode_stats:
+                response["decode"] = decode_stats
+            return jsonify(response)
         except Exception as e:
             app.logger.error(f"Error processing file {filename_to_save}: {e}")
             if os.path.exists(temp_audio_path) and file.tell() == 0 :
@@ -139,14 +172,21 @@ def train_profile_route():
             return jsonify({"success": False, "error": "Could not extract features from any selected file.","details": errors_encountered}), 400
 
         all_features_np = np.array(all_features, dtype=float) # Ensure float for calculation
-        current_target_profile_list = np.mean(all_features_np, axis=0).tolist()
+        mean_features_np = np.mean(all_features_np, axis=0)
+        try:
+            current_target_profile = quantize_embeddings(mean_features_np, app.config['EMBEDDING_DTYPE'])
+        except ValueError as ve: # e.g. values beyond float16 range
+            app.logger.warning(f"{ve} Storing profile as float32 instead.")
+            current_target_profile = quantize_embeddings(mean_features_np, "float32")
+        # Accuracy-vs-footprint report against the exact float64 mean, computed once per trained profile
+        current_target_profile["report"] = footprint_report(mean_features_np, all_features_np)
 
         # Persist the newly trained profile
         try:
             with open(PROFILE_FILE, 'w') as f:
-                json.dump(current_target_profile_list, f)
-            app.logger.info(f"Target voice profile saved to {PROFILE_FILE}")
-            target_voice_profile = current_target_profile_list # Update in-memory profile
+                json.dump(dict(embedding_to_json(current_target_profile), report=current_target_profile["report"]), f)
+            app.logger.info(f"Target voice profile saved to {PROFILE_FILE} as {current_target_profile['dtype']} ({embedding_nbytes(current_target_profile)} bytes)")
+            target_voice_profile = current_target_profile # Update in-memory profile
         except Exception as e:
             app.logger.error(f"Error saving target voice profile to {PROFILE_FILE}: {e}")
             # Continue to return success for training, but log this persistence error.
@@ -154,7 +194,8 @@ def train_profile_route():
 
         message = f"Training complete. Processed {processed_count} of {len(selected_filenames)} selected files. Profile updated."
         if errors_encountered: message += " Some files had issues: " + "; ".join(errors_encountered)
-        return jsonify({"success": True, "message": message, "profile_dimensionality": len(target_voice_profile)})
+        return jsonify({"success": True, "message": message, "profile_dimensionality": current_target_profile["matrix"].shape[1],
+                        "profile_dtype": current_target_profile["dtype"]})
 
     except ValueError as ve: # Catches errors from np.array conversion or np.mean if shapes mismatch
         app.logger.error(f"Error averaging features, possibly due to inconsistent feature vector shapes: {ve}")
@@ -186,18 +227,19 @@ def compare_voice_route():
     if not extraction_result.get("success"):
         return jsonify({"success": False, "error": f"Could not extract features from {filename_to_compare}: {extraction_result.get('error', 'Unknown extraction error')}"}), 500
 
+    profile = target_voice_profile # Local reference so a concurrent /train can't swap it mid-comparison
     current_voice_features_np = np.array(extraction_result["features"], dtype=float)
-    target_profile_np = np.array(target_voice_profile, dtype=float)
 
-    if current_voice_features_np.shape != target_profile_np.shape:
-        app.logger.error(f"Feature shape mismatch. Target: {target_profile_np.shape}, Current: {current_voice_features_np.shape}")
-        return jsonify({"success": False, "error": f"Feature shape mismatch. Target: {target_profile_np.shape}, Current: {current_voice_features_np.shape}."}), 500
-
-    distance = np.linalg.norm(target_profile_np - current_voice_features_np)
+    try:
+        distance = float(embedding_distances(profile, current_voice_features_np)[0])
+    except ValueError as ve:
+        app.logger.error(f"Comparison failed for {filename_to_compare}: {ve}")
+        return jsonify({"success": False, "error": str(ve)}), 500
     similarity = 1 / (1 + distance)
 
-    app.logger.info(f"Comparison for {filename_to_compare}: Distance={distance:.4f}, Similarity={similarity:.4f}")
-    return jsonify({"success": True, "filename_compared": filename_to_compare, "distance": float(distance), "similarity_score": float(similarity)})
+    app.logger.info(f"Comparison for {filename_to_compare}: Distance={distance:.4f}, Similarity={similarity:.4f} ({profile['dtype']} profile)")
+    return jsonify({"success": True, "filename_compared": filename_to_compare, "distance": distance, "similarity_score": similarity,
+                    "profile_dtype": profile["dtype"], "embedding_report": profile.get("report")})
 
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5001)
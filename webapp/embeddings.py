@@ -0,0 +1,163 @@
+import base64
+import binascii
+import json
+import sys
+import numpy as np
+
+# Storage dtypes for speaker embeddings, ordered from largest to smallest footprint.
+SUPPORTED_DTYPES = ("float64", "float32", "float16", "int8")
+DEFAULT_DTYPE = "float32"
+
+def quantize_embeddings(features, dtype=DEFAULT_DTYPE):
+    """
+    Packs one or more feature vectors into a compact embedding matrix.
+
+    Args:
+        features (list | np.ndarray): A single vector of shape (dim,) or a matrix of shape (n, dim).
+        dtype (str): One of SUPPORTED_DTYPES. "int8" applies per-row scalar quantization,
+                     storing one scale and offset per embedding alongside the codes.
+
+    Returns:
+        dict: {"dtype": str, "matrix": np.ndarray (n, dim), "scale": np.ndarray (n,) | None, "offset": np.ndarray (n,) | None}
+    """
+    if dtype not in SUPPORTED_DTYPES:
+        raise ValueError(f"Unsupported embedding dtype '{dtype}'. Expected one of {SUPPORTED_DTYPES}.")
+
+    values = np.atleast_2d(np.asarray(features, dtype=np.float64))
+    if dtype != "int8":
+        with np.errstate(over="ignore"):
+            matrix = values.astype(dtype)
+        if not np.all(np.isfinite(matrix)):
+            raise ValueError(f"Feature values exceed the range of {dtype} (max abs {np.abs(values).max():.4g}).")
+        return {"dtype": dtype, "matrix": matrix, "scale": None, "offset": None}
+
+    # Map each row's [min, max] range onto the 255 int8 codes [-127, 127].
+    lo, hi = values.min(axis=1), values.max(axis=1)
+    offset = (hi + lo) / 2
+    scale = (hi - lo) / 254
+    scale[scale == 0] = 1.0 # Constant rows quantize to code 0
+    codes = np.clip(np.rint((values - offset[:, None]) / scale[:, None]), -127, 127).astype(np.int8)
+    return {"dtype": dtype, "matrix": codes, "scale": scale.astype(np.float32), "offset": offset.astype(np.float32)}
+
+def dequantize_embeddings(embedding):
+    """Reconstructs a float64 matrix of shape (n, dim) from a compact embedding."""
+    matrix = embedding["matrix"].astype(np.float64)
+    if embedding["dtype"] == "int8":
+        matrix = matrix * embedding["scale"][:, None] + embedding["offset"][:, None]
+    return matrix
+
+def embedding_distances(embedding, query):
+    """
+    Computes the Euclidean distance between a query vector and every row of a compact embedding.
+
+    Rows are read straight from the compact matrix in float32 (int8 codes are scaled on the
+    fly), so large enrollment matrices are never expanded to a float64 copy.
+
+    Returns:
+        np.ndarray: Distances of shape (n,).
+    """
+    matrix = embedding["matrix"]
+    compute_dtype = np.float64 if embedding["dtype"] == "float64" else np.float32
+    query = np.asarray(query, dtype=compute_dtype)
+    if query.shape != matrix.shape[1:]:
+        raise ValueError(f"Feature shape mismatch. Target: {matrix.shape[1:]}, Current: {query.shape}.")
+
+    if embedding["dtype"] == "int8":
+        diff = matrix * embedding["scale"][:, None] + (embedding["offset"][:, None] - query)
+    else:
+        diff = matrix.astype(compute_dtype, copy=False) - query
+    return np.sqrt(np.einsum("ij,ij->i", diff, diff))
+
+def embedding_nbytes(embedding):
+    """Returns the in-memory size in bytes of the embedding's arrays (codes plus scale/offset)."""
+    total = embedding["matrix"].nbytes
+    if embedding["scale"] is not None:
+        total += embedding["scale"].nbytes + embedding["offset"].nbytes
+    return total
+
+def embedding_to_json(embedding):
+    """Serializes a compact embedding to a JSON-compatible dict with base64-encoded raw arrays."""
+    def encode(array):
+        return base64.b64encode(np.ascontiguousarray(array).tobytes()).decode("ascii")
+
+    data = {"format": "compact_embedding", "dtype": embedding["dtype"],
+            "shape": list(embedding["matrix"].shape), "matrix": encode(embedding["matrix"])}
+    if embedding["scale"] is not None:
+        data["scale"] = encode(embedding["scale"])
+        data["offset"] = encode(embedding["offset"])
+    return data
+
+def embedding_from_json(data):
+    """Inverse of embedding_to_json. Raises ValueError on malformed input."""
+    if not isinstance(data, dict) or data.get("format") != "compact_embedding":
+        raise ValueError("Not a compact embedding document.")
+    dtype = data.get("dtype")
+    if dtype not in SUPPORTED_DTYPES:
+        raise ValueError(f"Unsupported embedding dtype '{dtype}'.")
+
+    try:
+        shape = tuple(int(x) for x in data["shape"])
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"Invalid or missing embedding shape: {e}")
+    if len(shape) != 2:
+        raise ValueError(f"Embedding matrix must be 2-dimensional, got shape {shape}.")
+
+    def decode(field, array_dtype, expected_shape):
+        if field not in data:
+            raise ValueError(f"Compact embedding document is missing '{field}'.")
+        try:
+            array = np.frombuffer(base64.b64decode(data[field]), dtype=array_dtype).copy()
+        except (binascii.Error, TypeError) as e:
+            raise ValueError(f"Could not decode embedding field '{field}': {e}")
+        return array.reshape(expected_shape) # Raises ValueError on a size mismatch
+
+    embedding = {"dtype": dtype, "matrix": decode("matrix", dtype, shape), "scale": None, "offset": None}
+    if dtype == "int8":
+        embedding["scale"] = decode("scale", np.float32, shape[:1])
+        embedding["offset"] = decode("offset", np.float32, shape[:1])
+    return embedding
+
+def footprint_report(profile, queries=()):
+    """
+    Compares the legacy float64 list path against every compact dtype for one profile.
+
+    Meant to be computed once per trained profile, while the exact float64 profile is still available.
+
+    Args:
+        profile (list | np.ndarray): The exact float64 profile vector (the legacy path's baseline).
+        queries (list | np.ndarray): Feature vectors to measure distance error on, e.g. the training
+                                     vectors the profile was averaged from. May be empty.
+
+    Returns:
+        dict: Per-representation memory/serialized sizes, max reconstruction error and, if queries were
+              given, the mean/max absolute distance error vs float64. Dtypes whose range is exceeded
+              report {"error": str} instead.
+    """
+    profile_list = np.asarray(profile, dtype=np.float64).tolist()
+    profile_np = np.array(profile_list)
+    queries = np.asarray(queries, dtype=np.float64).reshape(-1, profile_np.shape[0])
+    baseline_distances = np.linalg.norm(queries - profile_np, axis=1)
+
+    report = {"float64_list": {
+        "memory_bytes": sys.getsizeof(profile_list) + sum(sys.getsizeof(x) for x in profile_list),
+        "serialized_bytes": len(json.dumps(profile_list)),
+        "max_reconstruction_error": 0.0,
+    }}
+    if len(queries):
+        report["float64_list"].update({"mean_distance_error": 0.0, "max_distance_error": 0.0})
+    for dtype in SUPPORTED_DTYPES:
+        try:
+            embedding = quantize_embeddings(profile_np, dtype)
+        except ValueError as e:
+            report[dtype] = {"error": str(e)}
+            continue
+        entry = {
+            "memory_bytes": embedding_nbytes(embedding),
+            "serialized_bytes": len(json.dumps(embedding_to_json(embedding))),
+            "max_reconstruction_error": float(np.abs(dequantize_embeddings(embedding)[0] - profile_np).max()),
+        }
+        if len(queries):
+            errors = np.abs([embedding_distances(embedding, q)[0] for q in queries] - baseline_distances)
+            entry.update({"mean_distance_error": float(errors.mean()), "max_distance_error": float(errors.max())})
+        report[dtype] = entry
+    return report
@@ -0,0 +1,357 @@
+"""
+Concurrency load-test harness for the voice web app.
+
+Starts app.py on a local threaded server with a deterministic stub recognition backend (no
+Google API calls, no MFCC extraction), drives mixed /recognize, /train, /compare and
+/list_recordings traffic at a configurable concurrency and rate, then reports throughput,
+latency percentiles and error rates and checks that no uploads were lost or clobbered and
+that every profile read was consistent with a trained profile.
+
+Usage (from the webapp directory):
+    python loadtest.py --concurrency 16 --requests 500 --rate 100 --shared-filename-ratio 0.2
+"""
+import argparse
+import hashlib
+import io
+import json
+import logging
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+import wave
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from werkzeug.serving import make_server, WSGIRequestHandler
+
+# app.py creates its upload folder and loads any saved profile at import time, so point it at a scratch folder first
+SCRATCH_FOLDER = tempfile.mkdtemp(prefix="voice_loadtest_")
+os.environ['UPLOAD_FOLDER'] = SCRATCH_FOLDER
+import app as voice_app
+from embeddings import quantize_embeddings, embedding_distances, embedding_from_json
+
+ENDPOINTS = ("recognize", "train", "compare", "list")
+SHARED_FILENAME = "recording.wav" # What every browser recording is saved as, so concurrent users collide on it
+STUB_LATENCY_S = 0.0 # Simulated recognizer/extractor time before the stub reads the upload; set from --stub-latency-ms
+
+# --- Deterministic stub backend ---
+def _read_bytes(audio_path):
+    with open(audio_path, "rb") as f:
+        return f.read()
+
+def stub_recognize(audio_bytes):
+    """The 'transcript' of an upload is the hash of its bytes, so clobbered files are detectable."""
+    return hashlib.sha256(audio_bytes).hexdigest()
+
+def stub_features(audio_bytes, n_mfcc=13):
+    seed = int.from_bytes(hashlib.sha256(audio_bytes).digest()[:8], "little")
+    return np.random.default_rng(seed).normal(0, 20, n_mfcc).tolist()
+
+def stub_recognize_speech_from_file(audio_path, language_code="en-US"):
+    time.sleep(STUB_LATENCY_S)
+    if not os.path.exists(audio_path):
+        return {"success": False, "error": f"Audio file not found at path: {audio_path}"}
+    return {"success": True, "text": stub_recognize(_read_bytes(audio_path))}
+
+def stub_extract_features(audio_path, n_mfcc=13):
+    time.sleep(STUB_LATENCY_S)
+    if not os.path.exists(audio_path):
+        return {"success": False, "error": f"Audio file not found for feature extraction: {audio_path}"}
+    return {"success": True, "features": stub_features(_read_bytes(audio_path), n_mfcc)}
+
+class _QuietRequestHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+def start_server():
+    """Installs the stub backend in app.py and serves it on a free port."""
+    voice_app.recognize_speech_from_file = stub_recognize_speech_from_file
+    voice_app.extract_features = stub_extract_features
+
+    server = make_server("127.0.0.1", 0, voice_app.app, threaded=True, request_handler=_QuietRequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+# --- HTTP client helpers ---
+def make_wav_bytes(token, duration_s=0.25, sample_rate=16000):
+    """A small valid WAV whose samples are derived from token, so every upload has unique content."""
+    rng = np.random.default_rng(int.from_bytes(hashlib.sha256(token.encode()).digest()[:8], "little"))
+    samples = (rng.normal(0, 0.1, int(duration_s * sample_rate)) * 32767).clip(-32768, 32767).astype(np.int16)
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(sample_rate)
+        wf.writeframes(samples.tobytes())
+    return buffer.getvalue()
+
+def http_request(url, data=None, headers=None, timeout=30):
+    """Returns (status_code, parsed_json_or_None)."""
+    req = urllib.request.Request(url, data=data, headers=headers or {}, method="POST" if data is not None else "GET")
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            return resp.status, json.loads(resp.read() or b"null")
+    except urllib.error.HTTPError as e:
+        try: body = json.loads(e.read() or b"null")
+        except ValueError: body = None
+        return e.code, body
+
+def post_json(url, payload):
+    return http_request(url, json.dumps(payload).encode(), {"Content-Type": "application/json"})
+
+def post_audio(url, filename, audio_bytes, language="en-US"):
+    boundary = uuid.uuid4().hex
+    body = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"language\"\r\n\r\n{language}\r\n"
+            f"--{boundary}\r\nContent-Disposition: form-data; name=\"audio_file\"; filename=\"{filename}\"\r\n"
+            f"Content-Type: audio/wav\r\n\r\n").encode() + audio_bytes + f"\r\n--{boundary}--\r\n".encode()
+    return http_request(url, body, {"Content-Type": f"multipart/form-data; boundary={boundary}"})
+
+# --- Load generator ---
+class LoadTest:
+    def __init__(self, base_url, args):
+        self.base_url = base_url
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.lock = threading.Lock()
+        self.results = {name: [] for name in ENDPOINTS} # (latency_s, ok, client_exception)
+        self.violations = []
+        self.uploads = {} # filename -> list of sha256 of every payload successfully recognized under that name
+        self.attempted_uploads = {} # filename -> set of sha256 of every payload sent under that name, whatever the outcome
+        self.unique_files = [] # Filenames written exactly once, safe to train/compare on
+        self.pending_profiles = {} # Expected compact profiles of /train requests in flight (the server may apply them before replying)
+        self.trained_profiles = [] # Expected compact profiles of /train requests that returned success
+        self.unconfirmed_profiles = [] # /train requests lost to a client-side exception; the server may still have applied them
+        self.dtype = voice_app.app.config['EMBEDDING_DTYPE']
+        weights = dict(item.split("=") for item in args.mix.split(","))
+        self.mix = [(name, float(weights.get(name, 0))) for name in ENDPOINTS]
+
+    def _violation(self, message):
+        with self.lock:
+            self.violations.append(message)
+
+    def _record(self, endpoint, latency, ok, client_exception=False):
+        with self.lock:
+            self.results[endpoint].append((latency, ok, client_exception))
+
+    def _pick_endpoint(self):
+        with self.lock:
+            has_files = bool(self.unique_files)
+            has_profile = bool(self.trained_profiles)
+            endpoint = self.rng.choices([n for n, _ in self.mix], weights=[w for _, w in self.mix])[0]
+        # /train and /compare need uploads to exist, and /compare a trained profile; fall back to the missing step
+        if endpoint in ("train", "compare") and not has_files:
+            return "recognize"
+        if endpoint == "compare" and not has_profile:
+            return "train"
+        return endpoint
+
+    def do_recognize(self):
+        token = uuid.uuid4().hex
+        with self.lock:
+            shared = self.rng.random() < self.args.shared_filename_ratio
+        filename = SHARED_FILENAME if shared else f"load_{token}.wav"
+        payload = make_wav_bytes(token)
+        expected_text = stub_recognize(payload)
+        # Recorded before sending: a failed or timed-out upload can still be the last writer on disk
+        with self.lock:
+            self.attempted_uploads.setdefault(filename, set()).add(hashlib.sha256(payload).hexdigest())
+
+        status, body = post_audio(f"{self.base_url}/recognize", filename, payload)
+        ok = status == 200 and bool(body and body.get("success"))
+        if ok:
+            if body.get("text") != expected_text:
+                self._violation(f"/recognize {filename}: transcript is for different content (upload clobbered while processing)")
+            with self.lock:
+                self.uploads.setdefault(body["filename"], []).append(hashlib.sha256(payload).hexdigest())
+                if not shared:
+                    self.unique_files.append(body["filename"])
+        return ok
+
+    def do_list(self):
+        with self.lock:
+            expected = set(self.uploads)
+        status, body = http_request(f"{self.base_url}/list_recordings")
+        ok = status == 200 and bool(body and body.get("success"))
+        if ok:
+            missing = expected - set(body.get("files", []))
+            if missing:
+                self._violation(f"/list_recordings is missing {len(missing)} completed upload(s), e.g. {sorted(missing)[0]}")
+        return ok
+
+    def do_train(self):
+        with self.lock:
+            filenames = self.rng.sample(self.unique_files, min(len(self.unique_files), self.rng.randint(1, 3)))
+        # Unique files are never rewritten, so their expected features are stable
+        features = [stub_features(_read_bytes(os.path.join(SCRATCH_FOLDER, f))) for f in filenames]
+        expected = quantize_embeddings(np.mean(np.array(features, dtype=float), axis=0), self.dtype)
+
+        token = object()
+        with self.lock:
+            self.pending_profiles[token] = expected
+        try:
+            status, body = post_json(f"{self.base_url}/train", {"filenames": filenames})
+        except Exception:
+            with self.lock:
+                self.unconfirmed_profiles.append(expected)
+            raise
+        finally:
+            with self.lock:
+                del self.pending_profiles[token]
+        ok = status == 200 and bool(body and body.get("success"))
+        if ok:
+            with self.lock:
+                self.trained_profiles.append(expected)
+        return ok
+
+    def do_compare(self):
+        with self.lock:
+            filename = self.rng.choice(self.unique_files)
+        # Only picked once a /train has succeeded, so a "no profile" 400 means the trained profile was lost
+        sent_at = time.perf_counter()
+        status, body = post_json(f"{self.base_url}/compare", {"filename": filename})
+        ok = status == 200 and bool(body and body.get("success"))
+        if not ok:
+            if status == 400:
+                self._violation(f"/compare {filename}: reported no trained profile after a /train had completed")
+            return ok
+
+        # The distance must match a successfully trained profile, or one whose /train was still in flight
+        with self.lock:
+            profiles = self.trained_profiles + self.unconfirmed_profiles + list(self.pending_profiles.values())
+        query = stub_features(_read_bytes(os.path.join(SCRATCH_FOLDER, filename)))
+        if not any(np.isclose(float(embedding_distances(p, query)[0]), body["distance"], rtol=1e-4, atol=1e-4) for p in profiles):
+            self._violation(f"/compare {filename} at t={sent_at:.3f}: distance {body['distance']:.6f} matches no trained profile (torn profile read)")
+        return ok
+
+    def _run_one(self, endpoint):
+        start = time.perf_counter()
+        try:
+            ok = getattr(self, f"do_{endpoint}")()
+        except Exception as e: # Timeouts, connection resets, ... under overload: an error, not an invariant violation
+            logging.getLogger(__name__).debug(f"{endpoint}: client-side exception {type(e).__name__}: {e}")
+            self._record(endpoint, time.perf_counter() - start, False, client_exception=True)
+            return
+        self._record(endpoint, time.perf_counter() - start, ok)
+
+    def run(self):
+        for _ in range(self.args.seed_files):
+            self._run_one("recognize")
+
+        in_flight = threading.BoundedSemaphore(self.args.concurrency)
+        interval = 1.0 / self.args.rate if self.args.rate > 0 else 0.0
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.args.concurrency) as pool:
+            for i in range(self.args.requests):
+                if interval:
+                    delay = start + i * interval - time.perf_counter()
+                    if delay > 0: time.sleep(delay)
+                in_flight.acquire()
+                future = pool.submit(self._run_one, self._pick_endpoint())
+                future.add_done_callback(lambda _: in_flight.release())
+        return time.perf_counter() - start
+
+    def check_final_state(self):
+        """End-of-run invariants on what is actually on disk and in the app's memory."""
+        folder = SCRATCH_FOLDER
+        for filename in self.uploads:
+            path = os.path.join(folder, filename)
+            if not os.path.exists(path):
+                self._violation(f"Lost file: {filename} was uploaded successfully but is missing")
+                continue
+            on_disk = hashlib.sha256(_read_bytes(path)).hexdigest()
+            attempted = self.attempted_uploads.get(filename, set())
+            if on_disk not in attempted:
+                self._violation(f"Clobbered file: {filename} matches none of the {len(attempted)} payload(s) sent under that name")
+
+        if self.trained_profiles:
+            memory_profile = voice_app.target_voice_profile
+            try:
+                with open(voice_app.PROFILE_FILE) as f:
+                    disk_profile = embedding_from_json(json.load(f))
+            except Exception as e:
+                self._violation(f"Profile file unreadable after run: {e}")
+                return
+            if memory_profile is None or not np.array_equal(memory_profile["matrix"], disk_profile["matrix"]):
+                self._violation("In-memory target profile differs from the persisted profile file")
+            if not any(np.array_equal(p["matrix"], disk_profile["matrix"]) for p in self.trained_profiles + self.unconfirmed_profiles):
+                self._violation("Persisted profile matches none of the trained profiles")
+
+    def report(self, elapsed):
+        summary = {"elapsed_s": elapsed, "endpoints": {}}
+        total = 0
+        for endpoint, samples in self.results.items():
+            if not samples:
+                continue
+            latencies_ms = np.array([s[0] for s in samples]) * 1000
+            errors = sum(1 for s in samples if not s[1])
+            total += len(samples)
+            summary["endpoints"][endpoint] = {
+                "requests": len(samples), "error_rate": errors / len(samples),
+                "client_exceptions": sum(1 for s in samples if s[2]),
+                "p50_ms": float(np.percentile(latencies_ms, 50)), "p90_ms": float(np.percentile(latencies_ms, 90)),
+                "p99_ms": float(np.percentile(latencies_ms, 99)), "max_ms": float(latencies_ms.max()),
+            }
+        summary["requests"] = total
+        summary["throughput_rps"] = total / elapsed if elapsed else 0.0
+        summary["violations"] = self.violations
+        return summary
+
+def print_report(summary):
+    print(f"\n{summary['requests']} requests in {summary['elapsed_s']:.2f}s ({summary['throughput_rps']:.1f} req/s)")
+    print(f"{'endpoint':<12}{'requests':>10}{'errors':>9}{'client exc':>12}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for endpoint, s in summary["endpoints"].items():
+        print(f"{endpoint:<12}{s['requests']:>10}{s['error_rate']:>9.1%}{s['client_exceptions']:>12}{s['p50_ms']:>10.1f}{s['p90_ms']:>10.1f}{s['p99_ms']:>10.1f}{s['max_ms']:>10.1f}")
+    if summary["violations"]:
+        print(f"\nINVARIANT VIOLATIONS ({len(summary['violations'])}):")
+        for v in summary["violations"][:20]:
+            print(f"  - {v}")
+        if len(summary["violations"]) > 20:
+            print(f"  ... and {len(summary['violations']) - 20} more")
+    else:
+        print("\nAll invariants held: no lost or clobbered files, consistent profile reads.")
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent load test for the voice web app using a stub recognizer.")
+    parser.add_argument("--concurrency", type=int, default=8, help="Maximum requests in flight.")
+    parser.add_argument("--requests", type=int, default=200, help="Total requests to send (after seeding).")
+    parser.add_argument("--rate", type=float, default=0, help="Target request rate per second (0 = as fast as possible).")
+    parser.add_argument("--mix", default="recognize=4,train=1,compare=3,list=2", help="Relative endpoint weights.")
+    parser.add_argument("--shared-filename-ratio", type=float, default=0.0,
+                        help=f"Fraction of uploads sent as '{SHARED_FILENAME}', like browser recordings.")
+    parser.add_argument("--stub-latency-ms", type=float, default=0,
+                        help="Delay before the stub backend reads a file, widening race windows like a slow recognizer.")
+    parser.add_argument("--seed-files", type=int, default=3, help="Uploads made sequentially before the run.")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for the request mix.")
+    parser.add_argument("--json", dest="json_path", help="Also write the report to this JSON file.")
+    parser.add_argument("--verbose", action="store_true", help="Show app log output.")
+    args = parser.parse_args()
+
+    global STUB_LATENCY_S
+    STUB_LATENCY_S = args.stub_latency_ms / 1000
+    if not args.verbose:
+        voice_app.app.logger.setLevel(logging.ERROR)
+
+    server, base_url = start_server()
+    try:
+        test = LoadTest(base_url, args)
+        elapsed = test.run()
+        test.check_final_state()
+        summary = test.report(elapsed)
+    finally:
+        server.shutdown()
+        shutil.rmtree(SCRATCH_FOLDER, ignore_errors=True)
+
+    print_report(summary)
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(summary, f, indent=2)
+    raise SystemExit(1 if summary["violations"] else 0)
+
+if __name__ == '__main__':
+    main()
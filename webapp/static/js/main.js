@@ -5,7 +5,9 @@ document.addEventListener('DOMContentLoaded', function() {
     const uploadButton = document.getElementById('uploadButton');
     const audioFileInput = document.getElementById('audioFile');
     const languageSelect = document.getElementById('language');
+    const downsampleCheckbox = document.getElementById('downsampleCheckbox');
     const statusDisplay = document.getElementById('status');
+    const transferStatsDisplay = document.getElementById('transferStats');
     const recognizedTextArea = document.getElementById('recognizedText');
 
     const refreshFilesButton = document.getElementById('refreshFilesButton');
@@ -21,6 +23,8 @@ document.addEventListener('DOMContentLoaded', function() {
     let audioChunks = [];
     let lastProcessedFilenameForComparison = null; // Stores filename from server after successful recognition/upload
 
+    const DOWNSAMPLE_RATE = 16000; // Matches the server's DECODE_SAMPLE_RATE
+
     // --- Check for MediaRecorder support ---
     if (!navigator.mediaDevices || !navigator.mediaDevices.getUserMedia) {
         statusDisplay.textContent = 'Critical Error: getUserMedia not supported on your browser!';
@@ -44,6 +48,7 @@ document.addEventListener('DOMContentLoaded', function() {
         uploadButton.disabled = isProcessing;
         trainButton.disabled = isProcessing;
         languageSelect.disabled = isProcessing;
+        downsampleCheckbox.disabled = isProcessing;
         refreshFilesButton.disabled = isProcessing;
         fileListSelect.disabled = isProcessing;
         // Compare button is enabled only if lastProcessedFilenameForComparison is set AND not processing
@@ -55,7 +60,11 @@ document.addEventListener('DOMContentLoaded', function() {
     recordButton.addEventListener('click', async () => {
         if (!mediaRecorder || mediaRecorder.state === "inactive") {
             try {
-                const stream = await navigator.mediaDevices.getUserMedia({ audio: true });
+                // With downsampling enabled, hint at mono 16 kHz capture. Browsers may ignore the sample rate hint and
+                // Opus runs at 48 kHz internally anyway, so the real saving comes from the lower bitrate set below.
+                const audioConstraints = downsampleCheckbox.checked ? { channelCount: 1, sampleRate: DOWNSAMPLE_RATE } : true;
+                const stream = await navigator.mediaDevices.getUserMedia({ audio: audioConstraints });
+                const captureSettings = stream.getAudioTracks()[0].getSettings(); // What the browser actually captures
                 const mimeTypes = ['audio/webm;codecs=opus', 'audio/ogg;codecs=opus', 'audio/wav'];
                 let selectedMimeType = mimeTypes.find(type => MediaRecorder.isTypeSupported(type)) || '';
 
@@ -68,7 +77,9 @@ document.addEventListener('DOMContentLoaded', function() {
                 }
                 console.log("Using MIME type for recording:", selectedMimeType || "browser default");
 
-                mediaRecorder = new MediaRecorder(stream, { mimeType: selectedMimeType });
+                const recorderOptions = { mimeType: selectedMimeType };
+                if (downsampleCheckbox.checked) recorderOptions.audioBitsPerSecond = 24000; // Plenty for 16 kHz mono speech
+                mediaRecorder = new MediaRecorder(stream, recorderOptions);
                 audioChunks = [];
 
                 mediaRecorder.ondataavailable = event => {
@@ -84,7 +95,7 @@ document.addEventListener('DOMContentLoaded', function() {
 
                     statusDisplay.textContent = `Recording stopped. Sending ${filenameForServer} for recognition...`;
                     setControlsState(true); // Keep controls disabled during send
-                    sendAudioForRecognition(recordedAudioBlob, filenameForServer);
+                    sendAudioForRecognition(recordedAudioBlob, filenameForServer, captureSettings);
                 };
 
                 mediaRecorder.onerror = (event) => {
@@ -122,7 +133,7 @@ document.addEventListener('DOMContentLoaded', function() {
     uploadButton.addEventListener('click', () => {
         const file = audioFileInput.files[0];
         if (file) {
-            const allowedExtensions = [".wav", ".flac", ".ogg"];
+            const allowedExtensions = [".wav", ".flac", ".ogg", ".webm", ".opus"];
             let isValidExtension = allowedExtensions.some(ext => file.name.toLowerCase().endsWith(ext));
             if (isValidExtension) {
                 statusDisplay.textContent = `File selected: ${file.name}. Uploading for recognition...`;
@@ -132,8 +143,8 @@ document.addEventListener('DOMContentLoaded', function() {
                 compareButton.disabled = true; // Disable until new recognition is successful
                 sendAudioForRecognition(file, file.name);
             } else {
-                statusDisplay.textContent = 'Please upload a WAV, FLAC, or OGG file.';
-                alert('Unsupported file type. Please upload a WAV, FLAC, or OGG file.');
+                statusDisplay.textContent = 'Please upload a WAV, FLAC, OGG, WebM or Opus file.';
+                alert('Unsupported file type. Please upload a WAV, FLAC, OGG, WebM or Opus file.');
                 audioFileInput.value = '';
             }
         } else {
@@ -142,8 +153,43 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     });
 
+    // --- Client-side Downsampling ---
+    function encodeWav(samples, sampleRate) {
+        // 16-bit PCM mono WAV: 44-byte RIFF header followed by little-endian samples
+        const buffer = new ArrayBuffer(44 + samples.length * 2);
+        const view = new DataView(buffer);
+        const writeString = (offset, str) => { for (let i = 0; i < str.length; i++) view.setUint8(offset + i, str.charCodeAt(i)); };
+        writeString(0, 'RIFF'); view.setUint32(4, 36 + samples.length * 2, true); writeString(8, 'WAVE');
+        writeString(12, 'fmt '); view.setUint32(16, 16, true); view.setUint16(20, 1, true); view.setUint16(22, 1, true);
+        view.setUint32(24, sampleRate, true); view.setUint32(28, sampleRate * 2, true); view.setUint16(32, 2, true); view.setUint16(34, 16, true);
+        writeString(36, 'data'); view.setUint32(40, samples.length * 2, true);
+        for (let i = 0; i < samples.length; i++) {
+            const s = Math.max(-1, Math.min(1, samples[i]));
+            view.setInt16(44 + i * 2, s < 0 ? s * 0x8000 : s * 0x7FFF, true);
+        }
+        return new Blob([buffer], { type: 'audio/wav' });
+    }
+
+    async function downsampleToWav(audioBlobOrFile) {
+        // Decode in the browser, then let an OfflineAudioContext mix down to mono and resample
+        const decodeContext = new (window.AudioContext || window.webkitAudioContext)();
+        let decoded;
+        try {
+            decoded = await decodeContext.decodeAudioData(await audioBlobOrFile.arrayBuffer());
+        } finally {
+            decodeContext.close();
+        }
+        const offlineContext = new OfflineAudioContext(1, Math.ceil(decoded.duration * DOWNSAMPLE_RATE), DOWNSAMPLE_RATE);
+        const source = offlineContext.createBufferSource();
+        source.buffer = decoded;
+        source.connect(offlineContext.destination);
+        source.start();
+        const rendered = await offlineContext.startRendering();
+        return encodeWav(rendered.getChannelData(0), DOWNSAMPLE_RATE);
+    }
+
     // --- API Interaction: Speech Recognition ---
-    async function sendAudioForRecognition(audioBlobOrFile, clientSideFilename) {
+    async function sendAudioForRecognition(audioBlobOrFile, clientSideFilename, captureSettings = null) {
         if (!audioBlobOrFile) {
             statusDisplay.textContent = 'No audio data to send.';
             setControlsState(false);
@@ -153,15 +199,46 @@ document.addEventListener('DOMContentLoaded', function() {
         recognizedTextArea.value = '';
         setControlsState(true);
 
+        // WAV/FLAC uploads are resampled to 16 kHz mono WAV before sending, but only kept if that is smaller
+        // (a compressed or already-16 kHz FLAC can grow). Recordings are already low-bitrate mono Opus when
+        // downsampling is on, so re-encoding them as WAV would only add bytes.
+        const originalBytes = audioBlobOrFile.size;
+        let prepMs = 0;
+        if (downsampleCheckbox.checked && /\.(wav|flac)$/i.test(clientSideFilename)) {
+            const prepStart = performance.now();
+            try {
+                const resampledBlob = await downsampleToWav(audioBlobOrFile);
+                prepMs = performance.now() - prepStart;
+                if (resampledBlob.size < originalBytes) {
+                    audioBlobOrFile = resampledBlob;
+                    clientSideFilename = clientSideFilename.replace(/\.[^.]+$/, '.wav');
+                } else {
+                    console.log(`Downsampled WAV (${resampledBlob.size} bytes) is not smaller than the original (${originalBytes} bytes); uploading original.`);
+                }
+            } catch (err) {
+                console.warn('Client-side downsampling failed, uploading original file:', err);
+            }
+        }
+
         const formData = new FormData();
         // The third argument to append is the filename that the server will see.
         formData.append('audio_file', audioBlobOrFile, clientSideFilename);
         formData.append('language', languageSelect.value);
 
         try {
+            const requestStart = performance.now();
             const response = await fetch('/recognize', { method: 'POST', body: formData });
             const result = await response.json();
 
+            // Upload size/latency breakdown, to measure the effect of downsampling and server-side decoding
+            let transferSummary = `Sent ${(audioBlobOrFile.size / 1024).toFixed(1)} KB`;
+            if (captureSettings) transferSummary += ` (captured ${captureSettings.sampleRate || '?'} Hz, ${captureSettings.channelCount || '?'} ch)`;
+            if (audioBlobOrFile.size !== originalBytes) transferSummary += ` (original ${(originalBytes / 1024).toFixed(1)} KB, downsampled in ${prepMs.toFixed(0)} ms)`;
+            if (result.decode) transferSummary += `, server decode ${result.decode.decode_ms.toFixed(0)} ms`;
+            transferSummary += `, round trip ${(performance.now() - requestStart).toFixed(0)} ms.`;
+            console.log(transferSummary, result.decode || '');
+            transferStatsDisplay.textContent = transferSummary; // Own element, so fetchFileList's status updates don't hide it
+
             if (response.ok && result.success) {
                 recognizedTextArea.value = result.text;
                 statusDisplay.textContent = 'Recognition complete.';
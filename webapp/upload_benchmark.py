@@ -0,0 +1,101 @@
+"""
+Measures the bytes and latency saved by client-side downsampling and server-side WebM/Opus decoding.
+
+Encodes one source clip into each upload format the web app can receive, with and without the
+16 kHz mono downsample option, then reports upload size, server-side decode time (the real
+decode_audio_to_wav pipe) and estimated end-to-end time at a few uplink speeds.
+
+Usage (from the webapp directory, ffmpeg on PATH or FFMPEG_BINARY set):
+    python upload_benchmark.py --input my_speech.wav
+    python upload_benchmark.py            # synthesizes a 10 s, 48 kHz stereo speech-like clip
+"""
+import argparse
+import io
+import os
+import shutil
+import statistics
+import subprocess
+import tempfile
+import wave
+
+import numpy as np
+
+import voice_processing
+from voice_processing import decode_audio_to_wav
+
+# (label, ffmpeg output args, extension, decoded on the server?)
+VARIANTS = [
+    ("wav, original rate/channels", ["-c:a", "pcm_s16le"], "wav", False),
+    ("wav, downsampled 16 kHz mono", ["-c:a", "pcm_s16le", "-ac", "1", "-ar", "16000"], "wav", False),
+    ("webm/opus, browser default", ["-c:a", "libopus", "-b:a", "{opus_bitrate}"], "webm", True),
+    # What the browser produces with the downsample option: the sample rate is only a hint and Opus runs at 48 kHz
+    ("webm/opus, mono 24 kbps (downsample option)", ["-c:a", "libopus", "-ac", "1", "-b:a", "24k"], "webm", True),
+]
+UPLINKS_MBPS = (1, 10)
+
+def synthesize_clip(path, duration_s=10, sample_rate=48000):
+    """Speech-like test signal: a gliding harmonic voice with syllable-rate amplitude modulation plus noise, in stereo."""
+    rng = np.random.default_rng(0)
+    t = np.arange(int(duration_s * sample_rate)) / sample_rate
+    pitch = 140 + 30 * np.sin(2 * np.pi * 0.7 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / sample_rate
+    voice = sum(np.sin(k * phase) / k for k in range(1, 12))
+    envelope = np.clip(np.sin(2 * np.pi * 4 * t), 0, None) ** 0.5
+    mono = 0.2 * voice * envelope + 0.01 * rng.normal(size=t.size)
+    stereo = np.stack([mono, 0.9 * mono], axis=1)
+    with wave.open(path, "wb") as wf:
+        wf.setnchannels(2)
+        wf.setsampwidth(2)
+        wf.setframerate(sample_rate)
+        wf.writeframes((stereo.clip(-1, 1) * 32767).astype(np.int16).tobytes())
+
+def encode(source, output_path, args):
+    subprocess.run([voice_processing.FFMPEG_BINARY, "-y", "-hide_banner", "-loglevel", "error", "-i", source, *args, output_path],
+                   check=True)
+
+def median_decode_ms(path, runs, scratch_dir):
+    with open(path, "rb") as f:
+        data = f.read()
+    timings = []
+    for _ in range(runs):
+        result = decode_audio_to_wav(io.BytesIO(data), os.path.join(scratch_dir, "decoded.wav"))
+        if not result["success"]:
+            raise RuntimeError(result["error"])
+        timings.append(result["decode_ms"])
+    return statistics.median(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare upload bytes and latency across formats and the downsample option.")
+    parser.add_argument("--input", help="Source audio clip (any format ffmpeg reads). Default: synthesized clip.")
+    parser.add_argument("--opus-bitrate", default="64k", help="Bitrate assumed for the browser's default Opus encoding.")
+    parser.add_argument("--runs", type=int, default=5, help="Decode runs per variant (median is reported).")
+    args = parser.parse_args()
+
+    scratch_dir = tempfile.mkdtemp(prefix="voice_upload_benchmark_")
+    try:
+        source = args.input
+        if not source:
+            source = os.path.join(scratch_dir, "source.wav")
+            synthesize_clip(source)
+
+        rows = []
+        for label, ffmpeg_args, ext, decoded in VARIANTS:
+            path = os.path.join(scratch_dir, f"variant_{len(rows)}.{ext}")
+            encode(source, path, [a.format(opus_bitrate=args.opus_bitrate) for a in ffmpeg_args])
+            size = os.path.getsize(path)
+            decode_ms = median_decode_ms(path, args.runs, scratch_dir) if decoded else 0.0
+            rows.append((label, size, decode_ms))
+    finally:
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+
+    baseline_bytes = rows[0][1]
+    header = "| Upload format | Bytes | vs original WAV | Server decode (ms) | " + \
+             " | ".join(f"Upload + decode @ {m} Mbps (ms)" for m in UPLINKS_MBPS) + " |"
+    print(header)
+    print("|" + "---|" * (header.count("|") - 1))
+    for label, size, decode_ms in rows:
+        totals = " | ".join(f"{size * 8 / (m * 1e6) * 1000 + decode_ms:.0f}" for m in UPLINKS_MBPS)
+        print(f"| {label} | {size:,} | {size / baseline_bytes:.1%} | {decode_ms:.1f} | {totals} |")
+
+if __name__ == '__main__':
+    main()
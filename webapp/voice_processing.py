@@ -1,8 +1,15 @@
 import speech_recognition as sr
 import os
+import subprocess
+import threading
+import time
+import uuid
+import wave
 import librosa # Added
 import numpy as np # Added
 
+FFMPEG_BINARY = os.environ.get("FFMPEG_BINARY", "ffmpeg")
+
 def recognize_speech_from_file(audio_path, language_code="en-US"):
     """
     Recognizes speech from an audio file using Google Speech Recognition.
@@ -61,6 +68,111 @@ def extract_features(audio_path, n_mfcc=13):
         print(f"Error extracting features from {audio_path}: {e}") # Print to server log for debugging
         return {"success": False, "error": f"Feature extraction failed: {str(e)}"}
 
+def decode_audio_to_wav(input_stream, output_path, sample_rate=16000, channels=1, chunk_size=64 * 1024, timeout=60):
+    """
+    Decodes any ffmpeg-readable audio stream (e.g. WebM/Opus from the browser) into a 16-bit PCM WAV file.
+
+    The upload is piped into ffmpeg's stdin and raw PCM is streamed from its stdout into a
+    hidden ".part" file next to output_path, which replaces output_path only once decoding
+    succeeds. A failed upload therefore never clobbers an existing recording, and readers
+    never see a half-written WAV. The encoded upload itself is never written to disk.
+
+    Args:
+        input_stream: A binary file-like object with the encoded audio (e.g. a Werkzeug FileStorage.stream).
+        output_path (str): Where to write the decoded WAV file.
+        sample_rate (int): Output sample rate in Hz.
+        channels (int): Output channel count.
+        chunk_size (int): Pipe read/write size in bytes.
+        timeout (int): Overall deadline in seconds; ffmpeg is killed if decoding takes longer.
+
+    Returns:
+        dict: {"success": True, "input_bytes": int, "output_bytes": int, "duration_s": float, "decode_ms": float}
+              on success, {"success": False, "error": "error message"} on failure.
+    """
+    command = [FFMPEG_BINARY, "-hide_banner", "-loglevel", "error", "-i", "pipe:0",
+               "-f", "s16le", "-acodec", "pcm_s16le", "-ac", str(channels), "-ar", str(sample_rate), "pipe:1"]
+    start = time.perf_counter()
+    try:
+        process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except OSError as e:
+        return {"success": False, "error": f"Could not start ffmpeg ('{FFMPEG_BINARY}') to decode audio: {e}"}
+
+    input_bytes, stderr_chunks, timed_out = [0], [], threading.Event()
+    output_bytes, error = 0, None
+    partial_path = os.path.join(os.path.dirname(output_path),
+                                f".{os.path.basename(output_path)}.{uuid.uuid4().hex}.part")
+
+    def kill_on_timeout():
+        timed_out.set()
+        try: process.kill()
+        except OSError: pass
+
+    def feed_stdin():
+        try:
+            while True:
+                chunk = input_stream.read(chunk_size)
+                if not chunk:
+                    break
+                input_bytes[0] += len(chunk)
+                process.stdin.write(chunk)
+        except (OSError, ValueError):
+            pass # ffmpeg exited early (e.g. invalid input) or was killed; its stderr explains why
+        finally:
+            try: process.stdin.close()
+            except OSError: pass
+
+    # The with-block closes all pipes and waits for ffmpeg on exit, so a killed process never lingers as a zombie
+    with process:
+        # stdin and stderr are serviced on helper threads so neither pipe can fill up and deadlock ffmpeg
+        feeder = threading.Thread(target=feed_stdin, daemon=True)
+        stderr_reader = threading.Thread(target=lambda: stderr_chunks.append(process.stderr.read()), daemon=True)
+        # Watchdog for the whole decode: a stuck ffmpeg that keeps stdout open would otherwise block the read loop forever
+        watchdog = threading.Timer(timeout, kill_on_timeout)
+        watchdog.daemon = True
+        feeder.start()
+        stderr_reader.start()
+        watchdog.start()
+
+        try:
+            with wave.open(partial_path, "wb") as wf:
+                wf.setnchannels(channels)
+                wf.setsampwidth(2)
+                wf.setframerate(sample_rate)
+                while True:
+                    pcm = process.stdout.read(chunk_size)
+                    if not pcm:
+                        break
+                    wf.writeframes(pcm)
+                    output_bytes += len(pcm)
+            return_code = process.wait(timeout=max(0.0, timeout - (time.perf_counter() - start)))
+        except Exception as e:
+            process.kill()
+            process.wait()
+            return_code, error = None, f"Audio decoding failed: {e}"
+        finally:
+            watchdog.cancel()
+        feeder.join(timeout=timeout)
+        stderr_reader.join(timeout=timeout)
+
+    if timed_out.is_set() or return_code != 0 or output_bytes == 0:
+        if timed_out.is_set():
+            error = f"Audio decoding timed out after {timeout} seconds."
+        elif return_code == 0:
+            error = "Decoded audio is empty."
+        elif return_code is not None:
+            details = b"".join(stderr_chunks).decode("utf-8", "replace").strip()
+            error = f"ffmpeg could not decode audio (exit code {return_code}){': ' + details if details else ''}"
+        try:
+            if os.path.exists(partial_path): os.remove(partial_path)
+        except OSError as remove_e:
+            print(f"Error cleaning up partial decode {partial_path}: {remove_e}")
+        return {"success": False, "error": error}
+
+    os.replace(partial_path, output_path)
+    return {"success": True, "input_bytes": input_bytes[0], "output_bytes": os.path.getsize(output_path),
+            "duration_s": output_bytes / (2 * channels * sample_rate),
+            "decode_ms": (time.perf_counter() - start) * 1000}
+
 
 # Example usage (for testing this module directly)
 if __name__ == '__main__':